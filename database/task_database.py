@@ -1,24 +1,125 @@
 """SQLite database wrapper for task management and queue."""
 import sqlite3
-from typing import List, Optional, Dict
-from datetime import datetime
-from task_management.task_model import Task, TaskFile, FileStatus
+import threading
+import time
+import queue
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter, attrgetter
+from pathlib import Path
+from typing import List, Optional, Dict, Iterable, Tuple
+from task_management.task_model import Task, TaskFile, FileStatus, FILE_STATUS_STR, FILE_STATUS_FROM_STR, from_epoch_us
+
+# Schema version stored in PRAGMA user_version, bump when the tables change
+SCHEMA_VERSION = 3
+
+# Number of read-only connections kept open for status/results endpoints
+READ_POOL_SIZE = 4
+
+# Explicit task_files column list, rows are read by name through sqlite3.Row
+FILE_COLUMNS = (
+    "task_id, file_index, file_name, file_path, status, progress, transcription, "
+    "language, duration, error_message, created_at, started_at, completed_at"
+)
+TF_FILE_COLUMNS = ", ".join(f"tf.{column.strip()}" for column in FILE_COLUMNS.split(","))
+
+# task_files columns that update_files can write on their own, and how each is read off a TaskFile
+FILE_FIELD_GETTERS = {
+    "status": lambda file: FILE_STATUS_STR[file.status],
+    "progress": attrgetter("progress"),
+    "transcription": attrgetter("transcription"),
+    "language": attrgetter("language"),
+    "duration": attrgetter("duration"),
+    "error_message": attrgetter("error_message"),
+    "started_at": attrgetter("started_at_us"),
+    "completed_at": attrgetter("completed_at_us"),
+}
+
+# How long (seconds) get_file_stats may serve a cached result under rapid polling
+STATS_CACHE_TTL = 0.5
+
 class TaskDatabase:
     # Initialize the database and create tasks table if it doesn't exist
-    def __init__(self, db_path: str = "tasks.db"):
+    def __init__(self, db_path: str = "tasks.db", read_pool_size: int = READ_POOL_SIZE):
         self.db_path = db_path
+        
+        # Single long-lived read-write connection in autocommit mode, sqlite3
+        # connections are not thread-safe so every use of it goes through _write()
+        self._lock = threading.Lock()
+        self._rw = self._connect()
         self._initialize_database()
+        
+        # Preallocated read-only connections, handed out by _read()
+        self._readers = queue.Queue()
+        for _ in range(read_pool_size):
+            self._readers.put(self._connect(read_only=True))
+        
+        # Short-lived cache for get_file_stats, invalidated on every write
+        self._stats_cache = None
+        self._stats_cache_ts = 0.0
+    
+    # Open a connection with WAL journaling and tuned pragmas applied
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        if read_only:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            
+            # Only takes effect on a new, empty database (and must precede WAL)
+            conn.execute("PRAGMA page_size=4096")
+            
+            # WAL lets status/queue reads proceed while workers write progress,
+            # synchronous=NORMAL is safe under WAL and avoids an fsync per commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA wal_autocheckpoint=1000")
+        
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-16000")  # 16MB
+        conn.execute("PRAGMA mmap_size=268435456")  # 256MB
+        return conn
+    
+    # Borrow a read-only connection from the pool
+    @contextmanager
+    def _read(self):
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
+    # Run a block of writes as one explicit transaction on the shared connection,
+    # BEGIN IMMEDIATE takes the write lock up front so we never hit SQLITE_BUSY midway
+    @contextmanager
+    def _write(self):
+        with self._lock:
+            self._rw.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._rw
+            except BaseException:
+                self._rw.execute("ROLLBACK")
+                raise
+            self._rw.execute("COMMIT")
     
     # Create tasks table
     def _initialize_database(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._write() as conn:
             cursor = conn.cursor()
             
+            # Older schemas stored timestamps as ISO text, tasks don't outlive a
+            # session (they're cleared at startup) so the tables are simply rebuilt
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            if version < SCHEMA_VERSION:
+                cursor.execute('DROP TABLE IF EXISTS task_files')
+                cursor.execute('DROP TABLE IF EXISTS tasks')
+            
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS tasks (
                     id TEXT PRIMARY KEY,
                     user_id TEXT,
-                    created_at TEXT,
+                    created_at INTEGER,
                     file_count INTEGER
                 )
             ''')
@@ -35,141 +136,189 @@ class TaskDatabase:
                     language TEXT,
                     duration REAL,
                     error_message TEXT,
-                    created_at TEXT,
-                    started_at TEXT,
-                    completed_at TEXT,
+                    created_at INTEGER,
+                    started_at INTEGER,
+                    completed_at INTEGER,
                     PRIMARY KEY (task_id, file_index),
                     FOREIGN KEY (task_id) REFERENCES tasks (id)
                 )
             ''')
             
-            # Index for faster queries
+            # Composite indexes cover the status filter plus the ORDER BY of the
+            # pending queue and completed-results queries, replacing the old status-only index
+            cursor.execute('DROP INDEX IF EXISTS idx_task_files_status')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_tf_status_created 
+                ON task_files (status, created_at)
+            ''')
+            
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_task_files_status 
-                ON task_files (status)
+                CREATE INDEX IF NOT EXISTS idx_tf_status_completed 
+                ON task_files (status, completed_at DESC)
             ''')
             
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_task_files_task_id 
                 ON task_files (task_id)
             ''')
-            conn.commit()
+            
+            # Refresh planner statistics so the new indexes get picked up
+            cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA optimize')
+            
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    
+    # Periodic upkeep, keeps planner stats current and bounds WAL file growth
+    def run_maintenance(self) -> None:
+        """Re-analyze task_files and checkpoint/truncate the WAL."""
+        with self._lock:
+            self._rw.execute("ANALYZE task_files")
+            self._rw.execute("PRAGMA wal_checkpoint(TRUNCATE)")
     
     # Add OR update a task in the database with status and results
     def add_task(self, task: Task) -> None:
+        self.add_tasks([task])
+    
+    def add_tasks(self, tasks: List[Task]) -> None:
+        """Add or update several tasks at once, batching the inserts per table."""
+        task_rows = [
+            (
+                task.id,
+                task.user_id,
+                task.created_at_us,
+                len(task.files)
+            )
+            for task in tasks
+        ]
         
-        with sqlite3.connect(self.db_path) as conn:
+        file_rows = [
+            (
+                file.task_id,
+                file.file_index,
+                file.file_name,
+                file.file_path,
+                FILE_STATUS_STR[file.status],
+                file.progress,
+                file.transcription,
+                file.language,
+                file.duration,
+                file.error_message,
+                file.created_at_us,
+                file.started_at_us,
+                file.completed_at_us
+            )
+            for task in tasks
+            for file in task.files
+        ]
+        
+        with self._write() as conn:
             cursor = conn.cursor()
             
-            # Insert/update task record
-            cursor.execute('''
+            # Insert/update task records
+            cursor.executemany('''
                 INSERT OR REPLACE INTO tasks (id, user_id, created_at, file_count)
                 VALUES (?, ?, ?, ?)
-            ''', (
-                task.id,
-                task.user_id,
-                task.created_at.isoformat(),
-                len(task.files)
-            ))
-            
-                    # Insert/update all file records
-            for file in task.files:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO task_files (
-                        task_id, file_index, file_name, file_path, status, progress,
-                        transcription, language, duration, error_message,
-                        created_at, started_at, completed_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    file.task_id,
-                    file.file_index,
-                    file.file_name,
-                    file.file_path,
-                    file.status.value,
-                    file.progress,
-                    file.transcription,
-                    file.language,
-                    file.duration,
-                    file.error_message,
-                    file.created_at.isoformat(),
-                    file.started_at.isoformat() if file.started_at else None,
-                    file.completed_at.isoformat() if file.completed_at else None
-                ))
-            
-            conn.commit()
+            ''', task_rows)
+            
+            # Insert/update all file records
+            cursor.executemany('''
+                INSERT OR REPLACE INTO task_files (
+                    task_id, file_index, file_name, file_path, status, progress,
+                    transcription, language, duration, error_message,
+                    created_at, started_at, completed_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', file_rows)
+        
+        self._stats_cache_ts = 0.0
+    
+    def update_files(self, updates: Iterable[Tuple[TaskFile, Iterable[str]]]) -> None:
+        """Write only the given columns of existing file rows, current values are read off each TaskFile."""
+        with self._write() as conn:
+            cursor = conn.cursor()
             
+            for file, columns in updates:
+                columns = tuple(columns)
+                assignments = ", ".join(f"{column} = ?" for column in columns)
+                cursor.execute(
+                    f"UPDATE task_files SET {assignments} WHERE task_id = ? AND file_index = ?",
+                    [FILE_FIELD_GETTERS[column](file) for column in columns] + [file.task_id, file.file_index]
+                )
+        
+        self._stats_cache_ts = 0.0
     
     # Retrieve a task by task ID
     def retrieve_task(self, task_id: str) -> Optional[Task]:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._read() as conn:
             cursor = conn.cursor()
             
-            cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
+            cursor.execute("SELECT id, user_id, created_at FROM tasks WHERE id = ?", (task_id,))
             task_row = cursor.fetchone()
                         
             if task_row:
                 # Get all files for this task
-                cursor.execute('''
-                    SELECT * FROM task_files WHERE task_id = ? ORDER BY file_index
+                cursor.execute(f'''
+                    SELECT {FILE_COLUMNS} FROM task_files WHERE task_id = ? ORDER BY file_index
                 ''', (task_id,))
-                file_rows = cursor.fetchall()
-
-                task = Task([], task_row[1])
-                task.id = task_row[0]
-                task.user_id = task_row[1]
-                task.created_at = datetime.fromisoformat(task_row[2])
                 
-                # Reconstruct TaskFile objects
-                task.files = []
-                for row in file_rows:
-                    file = TaskFile(row[3], row[1], row[0])
-                    file.file_name = row[2]
-                    file.status = FileStatus(row[4])
-                    file.progress = row[5]
-                    file.transcription = row[6]
-                    file.language = row[7]
-                    file.duration = row[8]
-                    file.error_message = row[9]
-                    file.created_at = datetime.fromisoformat(row[10])
-                    file.started_at = datetime.fromisoformat(row[11]) if row[11] else None
-                    file.completed_at = datetime.fromisoformat(row[12]) if row[12] else None
-                    
-                    task.files.append(file)
-
-                return task
+                return self._build_task(task_row["id"], task_row["user_id"], task_row["created_at"], cursor.fetchall())
             
             return None
     
+    # Reconstruct a Task and its TaskFile objects from database rows
+    def _build_task(self, task_id: str, user_id: Optional[str], created_at: int, file_rows) -> Task:
+        task = Task([], user_id)
+        task.id = task_id
+        task.created_at_us = created_at
+        
+        for row in file_rows:
+            file = TaskFile(row["file_path"], row["file_index"], row["task_id"])
+            file.file_name = row["file_name"]
+            file.status = FILE_STATUS_FROM_STR[row["status"]]
+            file.progress = row["progress"]
+            file.transcription = row["transcription"]
+            file.language = row["language"]
+            file.duration = row["duration"]
+            file.error_message = row["error_message"]
+            file.created_at_us = row["created_at"]
+            file.started_at_us = row["started_at"]
+            file.completed_at_us = row["completed_at"]
+            
+            task.files.append(file)
+        
+        return task
+    
     def retrieve_pending(self) -> List[Task]:
         """Retrieve all tasks that have pending files."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._read() as conn:
             cursor = conn.cursor()
             
-            # Find tasks with any pending files
-            cursor.execute('''
-                SELECT DISTINCT task_id FROM task_files 
-                WHERE status = ? 
-                ORDER BY created_at
+            # Fetch every task with any pending files together with all of its files
+            cursor.execute(f'''
+                SELECT t.user_id AS task_user_id, t.created_at AS task_created_at, {TF_FILE_COLUMNS}
+                FROM tasks t
+                JOIN task_files tf ON tf.task_id = t.id
+                WHERE t.id IN (
+                    SELECT DISTINCT task_id FROM task_files WHERE status = ?
+                )
+                ORDER BY t.created_at, t.id, tf.file_index
             ''', (FileStatus.PENDING.value,))
             
-            task_ids = [row[0] for row in cursor.fetchall()]
-            
-            # Retrieve full task objects
+            # Rows arrive grouped per task, build one Task per group
             tasks = []
-            for task_id in task_ids:
-                task = self.retrieve_task(task_id)
-                if task:
-                    tasks.append(task)
+            for task_id, group in groupby(cursor, key=itemgetter("task_id")):
+                rows = list(group)
+                tasks.append(self._build_task(task_id, rows[0]["task_user_id"], rows[0]["task_created_at"], rows))
             
             return tasks
         
     def get_completed_files(self, limit: int = 50) -> List[Dict]:
         """Get recently completed files across all tasks."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._read() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT task_id, file_index, filename, transcription, language, 
+                SELECT task_id, file_index, file_name AS filename, transcription, language, 
                        duration, completed_at
                 FROM task_files 
                 WHERE status = ? AND completed_at IS NOT NULL
@@ -177,40 +326,36 @@ class TaskDatabase:
                 LIMIT ?
             ''', (FileStatus.COMPLETED.value, limit))
             
-            return [
-                {
-                    "task_id": row[0],
-                    "file_index": row[1],
-                    "filename": row[2],
-                    "transcription": row[3],
-                    "language": row[4],
-                    "duration": row[5],
-                    "completed_at": row[6]
-                }
-                for row in cursor.fetchall()
-            ]
+            results = [dict(row) for row in cursor]
+            for result in results:
+                result["completed_at"] = from_epoch_us(result["completed_at"])
+            return results
             
     # ADDED: Get file-level statistics
     def get_file_stats(self) -> Dict:
         """Get statistics about file processing."""
-        with sqlite3.connect(self.db_path) as conn:
+        if self._stats_cache is not None and time.monotonic() - self._stats_cache_ts < STATS_CACHE_TTL:
+            return self._stats_cache
+        
+        with self._read() as conn:
             cursor = conn.cursor()
             
-            stats = {}
-            for status in FileStatus:
-                cursor.execute('''
-                    SELECT COUNT(*) FROM task_files WHERE status = ?
-                ''', (status.value,))
-                stats[status.value] = cursor.fetchone()[0]
-            
-            return {
-                "file_counts": stats,
-                "total_files": sum(stats.values())
-            }
+            # One grouped count instead of a query per status
+            stats = {status.value: 0 for status in FileStatus}
+            cursor.execute('SELECT status, COUNT(*) FROM task_files GROUP BY status')
+            for status, count in cursor:
+                stats[status] = count
+        
+        self._stats_cache = {
+            "file_counts": stats,
+            "total_files": sum(stats.values())
+        }
+        self._stats_cache_ts = time.monotonic()
+        return self._stats_cache
     
     def get_task_queue_position(self, task_id: str) -> int:
         """Get the position of a specific task in the queue (1-based)."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._read() as conn:
             cursor = conn.cursor()
             
             # Get all truly pending tasks ordered by creation time
@@ -230,24 +375,26 @@ class TaskDatabase:
 
     def count_truly_pending_tasks(self) -> int:
         """Count tasks where ALL files are still pending."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._read() as conn:
             cursor = conn.cursor()
             
+            # Walk only the pending rows (status index) and probe each task's
+            # other files by task_id, instead of grouping the whole table
             cursor.execute('''
-                SELECT COUNT(DISTINCT task_id) FROM task_files 
-                WHERE task_id IN (
-                    SELECT task_id FROM task_files 
-                    GROUP BY task_id 
-                    HAVING COUNT(*) = SUM(CASE WHEN status = ? THEN 1 ELSE 0 END)
+                SELECT COUNT(DISTINCT task_id) FROM task_files tf
+                WHERE status = ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM task_files other
+                    WHERE other.task_id = tf.task_id AND other.status != ?
                 )
-            ''', (FileStatus.PENDING.value,))
+            ''', (FileStatus.PENDING.value, FileStatus.PENDING.value))
             
             return cursor.fetchone()[0]
         
     # Clear all tasks from the database, for initialization or testing
     def clear_all(self) -> Dict[str, int]:
         """Clear all tasks and files from database. Returns counts of deleted records."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._write() as conn:
             cursor = conn.cursor()
             
             # Count records before deletion
@@ -260,10 +407,10 @@ class TaskDatabase:
             # Delete all records (files first due to foreign key)
             cursor.execute('DELETE FROM task_files')
             cursor.execute('DELETE FROM tasks')
-            
-            conn.commit()
-            
-            return {
-                "deleted_tasks": task_count,
-                "deleted_files": file_count
-            }
\ No newline at end of file
+        
+        self._stats_cache_ts = 0.0
+        
+        return {
+            "deleted_tasks": task_count,
+            "deleted_files": file_count
+        }
\ No newline at end of file
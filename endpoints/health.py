@@ -14,7 +14,7 @@ def create_health_endpoint(hw_info, start_time, api_version):
         current_model = task_manager.model_name
         
         return {"status": "normal", 
-                "system_gpu": hw_info["gpu_name"], 
+                "system_gpu": hw_info.gpu_name, 
                 "whispermodel": current_model,
                 "uptime_seconds": round(time.time() - start_time, 1),
                 "api_version": api_version}
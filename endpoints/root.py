@@ -4,17 +4,22 @@ import os
 
 router = APIRouter()
 
+# Load the test interface once at import, it never changes at runtime
+_HTML_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "test_interface.html")
+_HTML_ERROR = None
+try:
+    with open(_HTML_PATH, 'rb') as file:
+        _HTML_BYTES = file.read()
+except Exception as e:
+    _HTML_BYTES = None
+    _HTML_ERROR = e
+
 # Root endpoint serving a simple HTML inteface for testing & debugging
-@router.get("/")
-async def read_root():
-    try:
-        html_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "test_interface.html")
-        with open(html_path, 'r', encoding='utf-8') as file:
-            html_content = file.read()
-        return HTMLResponse(content=html_content, status_code=200)
-    except Exception as e:
+@router.get("/", response_class=HTMLResponse)
+def read_root():
+    if _HTML_BYTES is None:
         return JSONResponse(
             status_code=500,
-            content={"message": "Error loading test interface", "error": str(e)},
+            content={"message": "Error loading test interface", "error": str(_HTML_ERROR)},
         )
-    
\ No newline at end of file
+    return HTMLResponse(content=_HTML_BYTES, status_code=200)
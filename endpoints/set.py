@@ -1,15 +1,17 @@
-import whisper
+import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from hardware_utils import model_override
+from hardware_utils import model_override, get_model
 from task_management import task_manager
 
+log = logging.getLogger(__name__)
+
 router = APIRouter()
 
 class ModelRequest(BaseModel):
     model_name: str
 
-def create_model_endpoint(hw_info, current_model_name, gpu):
+def create_model_endpoint(hw_info, current_model_name, gpu, compute_type):
     """Create model override endpoint with injected dependencies."""
     
     @router.post("/set")
@@ -19,9 +21,9 @@ def create_model_endpoint(hw_info, current_model_name, gpu):
             # Validate the model using model_override with GPU defaulted to True
             validated_model = model_override(request.model_name, hw_info, gpu)
             
-            # Load the new model
-            print(f"Loading model: {validated_model}")
-            new_model = whisper.load_model(validated_model, device="cuda" if gpu else "cpu")
+            # Load the new model, reused from the model cache if it is already loaded
+            log.info("Loading model: %s", validated_model)
+            new_model = get_model(validated_model, gpu, compute_type)
             
             # Set the model globally in task_manager
             task_manager.set_model(new_model, validated_model)
@@ -32,10 +34,11 @@ def create_model_endpoint(hw_info, current_model_name, gpu):
                 "previous_model": current_model_name,
                 "new_model": validated_model,
                 "gpu_enabled": gpu,
+                "compute_type": compute_type,
                 "hardware_info": {
-                    "gpu_count": hw_info["gpu_count"],
-                    "total_vram_gb": hw_info["total_vram_bytes"] / (1024**3) if hw_info["total_vram_bytes"] else None,
-                    "system_ram_gb": hw_info["system_ram_bytes"] / (1024**3)
+                    "gpu_count": hw_info.gpu_count,
+                    "total_vram_gb": hw_info.total_vram_bytes / (1024**3) if hw_info.total_vram_bytes else None,
+                    "system_ram_gb": hw_info.system_ram_bytes / (1024**3)
                 }
             }
             
@@ -1,25 +1,71 @@
 from fastapi import APIRouter, HTTPException
-from task_management import task_manager
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from typing import Dict
+from task_management import task_manager, progress_channels
+from task_management.task_model import FileStatus, FILE_STATUS_STR, from_epoch_us
+import asyncio
+import orjson
 
+# Endpoints here are plain (sync) functions on purpose: FastAPI runs them in its
+# threadpool, so SQLite reads don't block the event loop while workers write progress.
+# Payloads are returned as ORJSONResponse directly: a plain dict would first go through
+# FastAPI's jsonable_encoder, a Python walk of the whole payload, before orjson ever sees it
 router = APIRouter()
 
 # Endpoint to get STATUS of transcription tasks
 @router.get("/status/{task_id}")
-async def get_task_status(task_id: str):
+def get_task_status(task_id: str):
     """Get task status with independent file results"""
-    task = task_manager.get_task(task_id)
+    # Live tasks memoize their payload until a file changes, so no response cache is kept here
+    status = task_manager.get_status(task_id)
     
-    if not task:
+    if not status:
         raise HTTPException(status_code=404, detail={
             "error": "TASK_NOT_FOUND",
             "message": f"Task {task_id} not found"
         })
 
-    return task.json_response_format()
+    return ORJSONResponse(status)
+
+# Server-Sent Events frame, orjson handles the datetimes in task payloads
+def _sse(message: Dict) -> bytes:
+    return b"data: " + orjson.dumps(message) + b"\n\n"
+
+# Stream live status updates of a task instead of polling /status (async: it awaits the update channel)
+@router.get("/events/{task_id}")
+async def stream_task_events(task_id: str):
+    """Push task progress as Server-Sent Events: a status snapshot, then file/progress events until done"""
+    
+    # Subscribe before taking the snapshot so no update falls between the two
+    channel = progress_channels.subscribe(task_id)
+    task = await asyncio.to_thread(task_manager.get_task, task_id)
+    if not task:
+        progress_channels.unsubscribe(task_id, channel)
+        raise HTTPException(status_code=404, detail={
+            "error": "TASK_NOT_FOUND",
+            "message": f"Task {task_id} not found"
+        })
+    
+    async def events():
+        try:
+            snapshot = task.json_response_format()
+            yield _sse({"event": "status", **snapshot})
+            if snapshot["summary"]["overall_status"] in ("completed", "failed"):
+                return
+            
+            while True:
+                message = await channel.get()
+                yield _sse(message)
+                if message["event"] == "done":
+                    return
+        finally:
+            progress_channels.unsubscribe(task_id, channel)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 # Get the STATUS of individual file within a task
 @router.get("/status/{task_id}/file/{file_index}")
-async def get_file_status(task_id: str, file_index: int):
+def get_file_status(task_id: str, file_index: int):
     file = task_manager.get_file(task_id, file_index)
     if not file:
         raise HTTPException(status_code=404, detail={
@@ -27,14 +73,14 @@ async def get_file_status(task_id: str, file_index: int):
             "message": f"File {file_index} not found in task {task_id}"
         })
     
-    return {
+    return ORJSONResponse({
         "task_id": task_id,
         "file": file.json_response_format()
-    }
+    })
 
 # Get the RESULT of individual file within a task
 @router.get("/results/{task_id}/file/{file_index}")
-async def get_file_result(task_id: str, file_index: int):
+def get_file_result(task_id: str, file_index: int):
     result = task_manager.get_file_result(task_id, file_index)
     if not result:
         file = task_manager.get_file(task_id, file_index)
@@ -47,15 +93,15 @@ async def get_file_result(task_id: str, file_index: int):
             raise HTTPException(status_code=400, detail={
                 "error": "RESULT_NOT_READY",
                 "message": f"File {file.file_name} is not completed yet",
-                "current_status": file.status.value,
+                "current_status": FILE_STATUS_STR[file.status],
                 "current_progress": file.progress
             })
     
-    return result
+    return ORJSONResponse(result)
 
 # Task (Parent of File) results
 @router.get("/results/{task_id}")
-async def get_task_results(task_id: str):
+def get_task_results(task_id: str):
     """Get results for completed task (all files must be done)"""
     
     task = task_manager.get_task(task_id)
@@ -65,36 +111,43 @@ async def get_task_results(task_id: str):
             "message": f"Task {task_id} not found"
         })
     
-    # Check if any files are still processing
-    incomplete_files = [f for f in task.files if f.status.value in ["pending", "processing"]]
+    # Single pass over the files: build results, find unfinished files and the latest completion
+    results = []
+    incomplete_files = []
+    latest_completed_us = None
+    for f in task.files:
+        if f.status is FileStatus.PENDING or f.status is FileStatus.PROCESSING:
+            incomplete_files.append(f.file_name)
+        # Compare the raw timestamps, only the latest is converted to a datetime
+        if f.completed_at_us is not None and (latest_completed_us is None or f.completed_at_us > latest_completed_us):
+            latest_completed_us = f.completed_at_us
+        results.append({
+            "file_index": f.file_index,
+            "file_name": f.file_name,
+            "status": FILE_STATUS_STR[f.status],
+            "transcription": f.transcription,
+            "language": f.language,
+            "duration": f.duration,
+            "error": f.error_message
+        })
+    
     if incomplete_files:
         raise HTTPException(status_code=400, detail={
             "error": "TASK_NOT_COMPLETE",
             "message": f"Task has {len(incomplete_files)} files still processing",
-            "incomplete_files": [f.file_name for f in incomplete_files]
+            "incomplete_files": incomplete_files
         })
     
-    return {
+    return ORJSONResponse({
         "task_id": task_id,
-        "completed_at": max(f.completed_at for f in task.files if f.completed_at).isoformat(),
-        "summary": task.json_response_format()["summary"],
-        "results": [
-            {
-                "file_index": f.file_index,
-                "file_name": f.file_name,
-                "status": f.status.value,
-                "transcription": f.transcription,
-                "language": f.language,
-                "duration": f.duration,
-                "error": f.error_message
-            }
-            for f in task.files
-        ]
-    }
+        "completed_at": from_epoch_us(latest_completed_us),
+        "summary": task.summary(),
+        "results": results
+    })
     
 # Get only completed results
 @router.get("/results/{task_id}/completed")
-async def get_completed_results(task_id: str):
+def get_completed_results(task_id: str):
     """Get only the completed file results (available immediately)"""
     
     completed_results = task_manager.get_completed_results(task_id)
@@ -104,11 +157,11 @@ async def get_completed_results(task_id: str):
             "message": f"Task {task_id} not found"
         })
     
-    return completed_results
+    return ORJSONResponse(completed_results)
 
 # Endpoint to get current queue information
 @router.get("/queue")
-async def get_queue_info():
+def get_queue_info():
     """Get information about the current task queue."""
-    return task_manager.get_queue_info()
+    return ORJSONResponse(task_manager.get_queue_info())
 
@@ -1,11 +1,17 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException, Form
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, gettempdir
+import asyncio
+import logging
 import os
+import re
+import shutil
 
 import magic
-from typing import List, Optional
+from typing import List, Optional, Tuple, BinaryIO
 from task_management.task_manager import add_task
 
+log = logging.getLogger(__name__)
+
 router = APIRouter()
 
 ALLOWED_MIME = {
@@ -25,41 +31,74 @@ ALLOWED_MIME = {
 # Safe file extensions for audio/video
 ALLOWED_EXTENSIONS = {'.mp3', '.wav', '.m4a', '.mp4', '.aac', '.ogg', '.webm', '.ts', '.mov'}
 
-# Actual MIME types to verify against file content
+# Actual MIME types to verify against file content, including the names libmagic reports
+# for the allowed containers (e.g. audio/x-wav, audio/x-m4a, video/webm)
 SAFE_CONTENT_TYPES = {
     'audio/mpeg', 'audio/wav', 'audio/mp4', 'audio/aac', 
-    'audio/ogg', 'audio/ts', 'video/mp4', 'video/quicktime'
+    'audio/ogg', 'audio/ts', 'video/mp4', 'video/quicktime',
+    'audio/x-wav', 'audio/vnd.wave', 'audio/x-m4a', 'audio/x-hx-aac-adts',
+    'audio/webm', 'video/webm', 'application/ogg', 'video/ogg'
 }
 
 MAX_FILES_PER_BATCH = 5
 MAX_FILE_SIZE = 1 * 1024 * 1024 * 1024  # 1GB
 
-def validate_file_safety(file: UploadFile, content: bytes) -> None:
+# Starlette has already spooled each upload before the handler runs, so its size and head are
+# checked on the spool first and only valid uploads are copied, in chunks, into UPLOAD_DIR.
+# 8KB is plenty for libmagic to identify audio/video containers
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+HEAD_SIZE = 8 * 1024
+
+# Reuse one libmagic handle instead of reloading the magic database per call
+try:
+    _MAGIC = magic.Magic(mime=True)
+except Exception:
+    _MAGIC = None
+
+# Uploads waiting for transcription live in their own directory, so files orphaned by a
+# crash (the task queue doesn't survive restarts) can be purged at startup. Only files with
+# UPLOAD_PREFIX are ever deleted, UPLOAD_DIR may be shared with other programs
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(gettempdir(), "transcraib-uploads"))
+UPLOAD_PREFIX = "transcraib-upload-"
+
+def reset_upload_dir() -> None:
+    """Create the upload directory and delete leftover uploads from a previous run."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(UPLOAD_PREFIX) and entry.is_file(follow_symlinks=False):
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+# Path traversal / reserved characters not allowed in filenames
+DANGEROUS_FILENAME_RE = re.compile(r'\.\.|[/\\<>:"|?*]')
+
+# Executable signatures (basic malware protection)
+EXECUTABLE_SIGNATURES = (
+    b'\x4d\x5a',  # PE executable (Windows .exe)
+    b'\x7f\x45\x4c\x46',  # ELF executable (Linux)
+    b'\xfe\xed\xfa',  # Mach-O executable (macOS)
+    b'\xcf\xfa\xed\xfe',  # Mach-O executable (macOS)
+)
+
+def validate_file_metadata(file: UploadFile) -> None:
     """
-    Validate file safety before processing.
+    Validate filename, extension and declared MIME type before the upload is written to disk.
     
     Args:
         file: The uploaded file object
-        content: The file content as bytes
         
     Raises:
         HTTPException: If file is unsafe or invalid
     """
-    # Check file size
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File too large")
-    
-    # Check if content is empty
-    if len(content) == 0:
-        raise HTTPException(status_code=400, detail="File is empty")
-    
     # Validate filename and extension
     if not file.filename:
         raise HTTPException(status_code=400, detail="Filename is required")
     
     # Check for dangerous characters in filename
-    dangerous_chars = ['..', '/', '\\', '<', '>', ':', '"', '|', '?', '*']
-    if any(char in file.filename for char in dangerous_chars):
+    if DANGEROUS_FILENAME_RE.search(file.filename):
         raise HTTPException(status_code=400, detail="Filename contains dangerous characters")
     
     # Check file extension
@@ -71,7 +110,6 @@ def validate_file_safety(file: UploadFile, content: bytes) -> None:
         )
     
     # Check declared MIME type with special handling for .ts files
-    file_ext = os.path.splitext(file.filename.lower())[1]
     if file.content_type not in ALLOWED_MIME:
         raise HTTPException(
             status_code=400, 
@@ -84,38 +122,76 @@ def validate_file_safety(file: UploadFile, content: bytes) -> None:
             status_code=400, 
             detail=f"text/plain MIME type is only allowed for .ts files, but received {file_ext}"
         )
+
+def validate_file_safety(file: UploadFile, size: int, head: bytes) -> None:
+    """
+    Validate file safety before processing.
+    
+    Args:
+        file: The uploaded file object
+        size: Size of the upload in bytes
+        head: The first bytes of the upload
+        
+    Raises:
+        HTTPException: If file is unsafe or invalid
+    """
+    # Check file size
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="File too large")
+    
+    # Check if content is empty
+    if size == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
     
-    # Verify actual file content using python-magic (optional but recommended)
-    try:
-        actual_mime = magic.from_buffer(content, mime=True)
-        # Special handling for .ts files - they can be detected as various MIME types
-        if file_ext == ".ts":
-            # Allow .ts files to have various MIME types since they can be transport streams
-            # or sometimes misdetected as other types
-            pass  # Skip content validation for .ts files
-        elif actual_mime not in SAFE_CONTENT_TYPES:
+    file_ext = os.path.splitext(file.filename.lower())[1]
+    
+    # Verify actual file content using python-magic (optional but recommended).
+    # Allow .ts files to have various MIME types since they can be transport streams
+    # or sometimes misdetected as other types
+    if _MAGIC is not None and file_ext != ".ts":
+        try:
+            actual_mime = _MAGIC.from_buffer(head)
+        except Exception:
+            # If magic fails, continue with basic validation
+            actual_mime = None
+        
+        if actual_mime is not None and actual_mime not in SAFE_CONTENT_TYPES:
             raise HTTPException(
                 status_code=400, 
                 detail=f"File content doesn't match expected audio/video format. Detected: {actual_mime}"
             )
-    except Exception:
-        # If magic fails, continue with basic validation
-        # This ensures the API still works even if python-magic isn't available
-        pass
     
     # Check for executable signatures (basic malware protection)
-    executable_signatures = [
-        b'\x4d\x5a',  # PE executable (Windows .exe)
-        b'\x7f\x45\x4c\x46',  # ELF executable (Linux)
-        b'\xfe\xed\xfa',  # Mach-O executable (macOS)
-        b'\xcf\xfa\xed\xfe',  # Mach-O executable (macOS)
-    ]
-    
-    for signature in executable_signatures:
-        if content.startswith(signature):
-            raise HTTPException(status_code=400, detail="Error: executable files are not allowed")
+    if head.startswith(EXECUTABLE_SIGNATURES):
+        raise HTTPException(status_code=400, detail="Error: executable files are not allowed")
     
-    print(f"✅ File validation passed for: {file.filename} ({len(content)} bytes)")
+    log.info("✅ File validation passed for: %s (%d bytes)", file.filename, size)
+
+def _inspect_upload(src: BinaryIO) -> Tuple[int, bytes]:
+    """Size and first HEAD_SIZE bytes of a spooled upload, blocking, so it is run in a worker thread."""
+    size = src.seek(0, os.SEEK_END)
+    src.seek(0)
+    head = src.read(HEAD_SIZE)
+    src.seek(0)
+    return size, head
+
+def _save_upload(src: BinaryIO, filename: str) -> str:
+    """Copy a spooled upload into UPLOAD_DIR and return its path, blocking, so it is run in a worker thread."""
+    with NamedTemporaryFile(delete=False, dir=UPLOAD_DIR, prefix=UPLOAD_PREFIX, suffix=f"_{filename}") as temp_file:
+        try:
+            shutil.copyfileobj(src, temp_file, UPLOAD_CHUNK_SIZE)
+        except BaseException:
+            _cleanup_temp_files([temp_file.name])
+            raise
+    return temp_file.name
+
+def _cleanup_temp_files(paths: List[str]) -> None:
+    """Remove temp uploads, blocking, so it is run in a worker thread."""
+    for path in paths:
+        try:
+            os.unlink(path)  # one syscall, no exists()/remove() race
+        except FileNotFoundError:
+            pass
 
 def create_transcribe_endpoint(model, model_name):
     """Create transcribe endpoint with injected model dependency."""
@@ -139,17 +215,15 @@ def create_transcribe_endpoint(model, model_name):
         # Process each uploaded file    
         try:
             for file in files:
-                # Read file content
-                content = await file.read()
+                # Validate name and declared type before anything touches disk
+                validate_file_metadata(file)
                 
-                # Validate file safety before processing
-                validate_file_safety(file, content)
+                # Validate file safety on the spooled upload before anything is copied
+                size, head = await asyncio.to_thread(_inspect_upload, file.file)
+                validate_file_safety(file, size, head)
                 
-                # Write to temp file and add to list
-                temp_file = NamedTemporaryFile(delete=False, suffix=f"_{file.filename}")
-                temp_file.write(content)
-                temp_file.close()
-                temp_file_paths.append(temp_file.name)
+                # Copy it into the upload directory off the event loop
+                temp_file_paths.append(await asyncio.to_thread(_save_upload, file.file, file.filename))
             
             # Create a new transcription task
             task_id = await add_task(temp_file_paths, user_id)
@@ -165,13 +239,12 @@ def create_transcribe_endpoint(model, model_name):
         
         # Cleanup temp files on error
         except HTTPException:
-            # Clean up temp files on validation error
-            for path in temp_file_paths:
-                if os.path.exists(path):
-                    os.remove(path)
+            # Clean up temp files on validation error, off the event loop
+            await asyncio.to_thread(_cleanup_temp_files, temp_file_paths)
             raise        
         
         except Exception as e:
+            await asyncio.to_thread(_cleanup_temp_files, temp_file_paths)
             raise HTTPException(status_code=500, detail=f"Failed to save and process upload. Reason: {e}")
     
     return router
\ No newline at end of file
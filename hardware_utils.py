@@ -1,58 +1,140 @@
+import os
+import functools
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
 import torch
 import psutil
+import numpy as np
+from faster_whisper import WhisperModel, BatchedInferencePipeline
 
+@functools.lru_cache(maxsize=32)
 def bytes_to_gb(b):
     """Convert bytes to gigabytes with 2 decimal places."""
     return None if b is None else round(b / (1024 ** 3), 2)
 
+# Detected system information, immutable once detected
+@dataclass(frozen=True, slots=True)
+class HardwareInfo:
+    system_ram_bytes: int
+    device: str = "cpu/unknown"
+    accelerator: Optional[str] = None
+    gpu_name: Optional[str] = None
+    gpu_count: int = 0
+    total_vram_bytes: Optional[int] = None
 
-def detect_hardware():
+# Hardware doesn't change while the process runs, so it is only probed once
+@functools.lru_cache(maxsize=1)
+def detect_hardware() -> HardwareInfo:
     """Detect available hardware and return system information."""
-    hardware = {
-        "device": "cpu/unknown",
-        "accelerator": None,       
-        "gpu_name": None,
-        "gpu_count": 0,
-        "total_vram_bytes": None, 
-        "system_ram_bytes": psutil.virtual_memory().total,
-    }
+    system_ram = psutil.virtual_memory().total
     
     if torch.cuda.is_available():
         try: 
             gpu_count = torch.cuda.device_count()
-            highest_vram = max(range(gpu_count), key=lambda i: torch.cuda.get_device_properties(i).total_memory )
-            total_vram = torch.cuda.get_device_properties(0).total_memory if gpu_count > 0 else None
-            hardware.update({
-                "device": f"cuda:{highest_vram}",
-                "accelerator": "cuda",
-                "gpu_name": torch.cuda.get_device_name(highest_vram),
-                "gpu_count": gpu_count,
-                "total_vram_bytes": total_vram,
-            })
-            return hardware
+            # Fetch each device's properties once, then pick the GPU with the most VRAM
+            props = [torch.cuda.get_device_properties(i) for i in range(gpu_count)]
+            highest_vram = max(range(gpu_count), key=lambda i: props[i].total_memory)
+            return HardwareInfo(
+                system_ram_bytes=system_ram,
+                device=f"cuda:{highest_vram}",
+                accelerator="cuda",
+                gpu_name=props[highest_vram].name,
+                gpu_count=gpu_count,
+                total_vram_bytes=props[highest_vram].total_memory,
+            )
         except Exception:
             pass
         
-        return hardware
-    return hardware
+    return HardwareInfo(system_ram_bytes=system_ram)
 
 # Select model based on hardware capabilities
 def model_pick(hardware):
-    """Select the appropriate Whisper model based on available hardware."""
-    if hardware["accelerator"] == "cuda":
+    """Select the appropriate Whisper model and CTranslate2 compute type based on available hardware."""
+    if hardware.accelerator == "cuda":
         gpu = True
-        vram_size = bytes_to_gb(hardware["total_vram_bytes"])
+        vram_size = bytes_to_gb(hardware.total_vram_bytes)
+        compute_type = compute_type_pick(hardware)
         if vram_size > 6:
-            return "turbo", gpu
+            return "turbo", gpu, compute_type
         elif vram_size > 5:
-            return "medium", gpu
+            return "medium", gpu, compute_type
         elif vram_size > 2:
-            return "small", gpu
+            return "small", gpu, compute_type
         else:
-            return "base", gpu
+            return "base", gpu, compute_type
     else:
         gpu = False
-        return "base", gpu
+        return "base", gpu, compute_type_pick(hardware)
+
+def compute_type_pick(hardware):
+    """Select the quantization for the model weights: fp16 with enough VRAM, int8 otherwise."""
+    if hardware.accelerator == "cuda":
+        vram_size = bytes_to_gb(hardware.total_vram_bytes)
+        if vram_size > 6:
+            return "float16"
+        elif vram_size > 4:
+            return "int8_float16"
+        return "int8"
+    return "int8"
+
+# Concurrent transcribe() calls, the single knob for inference concurrency: it sizes the model's
+# workers, the inference executor and the processor's inference slots alike. One on GPU serializes
+# kernel launches, on CPU two calls each get half the cores. TRANSCRIBE_WORKERS overrides either
+def inference_workers(gpu=False):
+    """Number of transcriptions that run at once on this device."""
+    return int(os.getenv("TRANSCRIBE_WORKERS", 1 if gpu else 2))
+
+def cpu_threads_per_worker(workers):
+    """Split the physical cores (minus one left for the event loop and DB writer) across the model workers."""
+    physical = psutil.cpu_count(logical=False) or 1
+    return max(1, (physical - 1) // workers)
+
+def load_model(model_name, gpu=False, compute_type="int8"):
+    """Load a faster-whisper (CTranslate2) model wrapped in the batched inference pipeline."""
+    workers = inference_workers(gpu)
+    model = WhisperModel(
+        model_name,
+        device="cuda" if gpu else "cpu",
+        compute_type=compute_type,
+        cpu_threads=cpu_threads_per_worker(workers),  # avoids oversubscribing with the default of all cores per worker
+        num_workers=workers,  # one per concurrent transcribe() call, so each actually runs in parallel
+    )
+    pipeline = BatchedInferencePipeline(model=model)
+    warmup_model(pipeline)
+    return pipeline
+
+# Loaded models kept for reuse by (name, gpu, compute_type), least recently used evicted first.
+# Each entry holds a full model in (V)RAM, so the default only keeps the active one
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "1"))
+_MODEL_CACHE = OrderedDict()
+_MODEL_CACHE_LOCK = threading.Lock()
+
+def get_model(model_name, gpu=False, compute_type="int8"):
+    """Return a cached model for this configuration, loading (and caching) it on first use."""
+    key = (model_name, gpu, compute_type)
+    # Loads are serialized so two requests for the same model never load it twice
+    with _MODEL_CACHE_LOCK:
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            model = load_model(model_name, gpu, compute_type)
+            _MODEL_CACHE[key] = model
+        _MODEL_CACHE.move_to_end(key)
+        
+        while len(_MODEL_CACHE) > MODEL_CACHE_SIZE:
+            _MODEL_CACHE.popitem(last=False)
+        return model
+
+# Seconds of silence used to warm up a freshly loaded model (VAD off requires <= 30s)
+WARMUP_SECONDS = 10
+
+def warmup_model(model):
+    """Run one dummy transcription so kernel selection and allocator caching happen before the first request."""
+    silence = np.zeros(16000 * WARMUP_SECONDS, dtype=np.float32)
+    segments, _ = model.transcribe(silence, vad_filter=False)
+    for _ in segments:  # segments are lazy, consume them to actually run the decoder
+        pass
 
 def model_override(model_name, hardware, gpu=False):
     """Override model selection, useful for testing."""
@@ -61,13 +143,13 @@ def model_override(model_name, hardware, gpu=False):
     if model_name in valid_models:
         
         if gpu:
-            vram_size = bytes_to_gb(hardware["total_vram_bytes"])
+            vram_size = bytes_to_gb(hardware.total_vram_bytes)
             if valid_models[model_name] > vram_size:
                 raise ValueError("Insufficient VRAM for the selected model")
             return model_name
                 
         else:
-            size = bytes_to_gb(hardware["system_ram_bytes"])
+            size = bytes_to_gb(hardware.system_ram_bytes)
             if valid_models[model_name] > size * 1.5:
                 raise ValueError("Insufficient system RAM for the selected model")
             return model_name
@@ -1,22 +1,53 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import whisper, time, os
-from database.task_database import TaskDatabase
+import time, os, sys, asyncio
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
 from task_management import task_manager
-from hardware_utils import detect_hardware, model_pick
+from task_management.log_context import TaskContextFilter
+from hardware_utils import detect_hardware, model_pick, get_model, inference_workers
 from endpoints.health import create_health_endpoint
-from endpoints.transcribe import create_transcribe_endpoint
+from endpoints.transcribe import create_transcribe_endpoint, reset_upload_dir
 from endpoints.set import create_model_endpoint
 from endpoints.root import router as root_router
 from endpoints.status import router as status_router
 
+# Logging: handlers only enqueue records, a background listener thread does the actual
+# formatting and stream writes so a slow stdout pipe never blocks the event loop
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(task_id)s %(file_name)s]: %(message)s"
+
+def setup_logging() -> QueueListener:
+    """Route all logging through a queue drained by a QueueListener thread."""
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    
+    # The context filter runs on the handler, in the logging thread, so it sees that thread's task context
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(TaskContextFilter())
+    
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+log_listener = setup_logging()
+log = logging.getLogger(__name__)
+
 # API Configuration 
 API_VERSION = "1.0.0"
 app = FastAPI(
     title="Whisper Transcription API", 
     version=API_VERSION,
-    description="Audio/Video transcription API with queue management"
+    description="Audio/Video transcription API with queue management",
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -27,35 +58,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Size of the default executor behind asyncio.to_thread (SQLite writes, file cleanup, audio decoding)
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", min(32, (os.cpu_count() or 1) + 4)))
+
+# Seconds between database maintenance runs (ANALYZE + WAL checkpoint)
+DB_MAINTENANCE_INTERVAL = 60 * 60
+
+async def db_maintenance():
+    """Run TaskDatabase maintenance periodically in a worker thread."""
+    while True:
+        await asyncio.sleep(DB_MAINTENANCE_INTERVAL)
+        try:
+            await asyncio.to_thread(task_manager.db.run_maintenance)
+        except Exception as e:
+            log.error("Database maintenance failed: %s", e)
+
+@app.on_event("startup")
+async def start_background_jobs():
+    # Explicitly sized default executor for blocking filesystem/database calls
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="blocking-io")
+    )
+    
+    # Keep a reference on app.state so the task isn't garbage collected
+    app.state.db_maintenance_task = asyncio.create_task(db_maintenance())
+
+@app.on_event("shutdown")
+def stop_logging():
+    # Flush whatever is still queued before the process exits
+    log_listener.stop()
+
 def main():
-    db = TaskDatabase()
+    # Share the task manager's database so only one set of connections is kept open
+    db = task_manager.db
     
     # Log & Hardware Detection
-    print("Detecting hardware...")
+    log.info("Detecting hardware...")
     HW = detect_hardware()
-    print("Hardware Info:", HW)
+    log.info("Hardware Info: %s", HW)
     
-    if HW["gpu_count"] == 0:
-        print("Warning: No GPU detected, Transcription will utilize CPU, this may be slow.")
+    if HW.gpu_count == 0:
+        log.warning("No GPU detected, Transcription will utilize CPU, this may be slow.")
         
     # Load Whisper Model based on hardware
-    MODEL_NAME, GPU = model_pick(HW)
-    print("Selected Model:", MODEL_NAME)
-    model = whisper.load_model(MODEL_NAME, device="cuda" if GPU else "cpu")
+    MODEL_NAME, GPU, COMPUTE_TYPE = model_pick(HW)
+    log.info("Selected Model: %s Compute Type: %s", MODEL_NAME, COMPUTE_TYPE)
+    model = get_model(MODEL_NAME, GPU, COMPUTE_TYPE)
+    
+    # Dedicated pool for blocking inference, kept out of the default executor.
+    # One thread per model worker, more would only block inside CTranslate2
+    INFER_WORKERS = inference_workers(GPU)
+    INFER_EXECUTOR = ThreadPoolExecutor(max_workers=INFER_WORKERS, thread_name_prefix="whisper")
     
     # Default a model globally in task_manager (based on initial hardware detection)
-    task_manager.set_model(model, MODEL_NAME)
+    task_manager.set_model(model, MODEL_NAME, INFER_EXECUTOR, INFER_WORKERS)
 
     # Clear any existing tasks from previous sessions
     db.clear_all()
-    print("Cleared existing tasks from previous sessions.")
+    reset_upload_dir()  # their uploads will never be processed either
+    log.info("Cleared existing tasks and uploads from previous sessions.")
     
     START_TIME = time.time()
 
     # Initialize the endpoints with dependencies
     health_router = create_health_endpoint(HW, START_TIME, API_VERSION)
     transcribe_router = create_transcribe_endpoint(model, MODEL_NAME)
-    set_model_router = create_model_endpoint(HW, MODEL_NAME, GPU)
+    set_model_router = create_model_endpoint(HW, MODEL_NAME, GPU, COMPUTE_TYPE)
 
     # Include the routers and endpoints
     app.include_router(health_router)
@@ -65,8 +133,15 @@ def main():
     app.include_router(status_router, prefix="/task", tags=["Task Management"])
 
     
-    print("Whisper Transcription API Ready")
+    log.info("Whisper Transcription API Ready")
     return app
     
 app = main()
 
+if __name__ == "__main__":
+    import uvicorn
+    
+    # uvloop event loop and httptools parser (both ship with uvicorn[standard]).
+    # Single worker only: the task queue and Whisper model live in this process
+    uvicorn.run(app, host="0.0.0.0", port=9005, loop="uvloop", http="httptools")
+
@@ -0,0 +1,15 @@
+import logging
+from contextvars import ContextVar
+
+# Task and file being worked on by the current asyncio task, stamped onto every log record
+# so messages don't have to repeat them and concurrent files stay distinguishable
+task_ctx: ContextVar[str] = ContextVar("task_id", default="-")
+file_ctx: ContextVar[str] = ContextVar("file_name", default="-")
+
+class TaskContextFilter(logging.Filter):
+    """Add task_id and file_name attributes from the current context to log records."""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.task_id = task_ctx.get()
+        record.file_name = file_ctx.get()
+        return True
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Dict, Optional, Set, Tuple, List
+from .task_model import Task, TaskFile
+from database.task_database import TaskDatabase
+
+log = logging.getLogger(__name__)
+
+# Window (seconds) in which repeated saves of the same task are coalesced into one write
+FLUSH_DELAY = 0.05
+
+# Debounced task persistence: the Task objects stay authoritative in memory, saves
+# are collected for FLUSH_DELAY and written together in one worker-thread call.
+# Whole tasks (flush_now) go through add_tasks, single-file changes only write the columns that changed.
+# Writes are serialized and take their snapshot once they hold the lock, so flushes requested
+# while one is in flight collapse into a single follow-up write
+class PendingWriter:
+    """Coalesce task saves into batched database writes."""
+    
+    def __init__(self, db: TaskDatabase, delay: float = FLUSH_DELAY):
+        self.db = db
+        self.delay = delay
+        self._dirty: Dict[str, Task] = {}
+        self._dirty_files: Dict[Tuple[str, int], Tuple[TaskFile, Set[str]]] = {}
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._write_lock = asyncio.Lock()
+        
+        # Background flushes in flight, referenced so they aren't garbage collected
+        self._flushes: Set[asyncio.Task] = set()
+    
+    def schedule_file(self, file: TaskFile, *columns: str):
+        """Mark columns of one file as changed, only those are written at the end of the current window."""
+        key = (file.task_id, file.file_index)
+        if key in self._dirty_files:
+            self._dirty_files[key][1].update(columns)
+        else:
+            self._dirty_files[key] = (file, set(columns))
+        self._arm()
+    
+    async def flush_now(self, task: Optional[Task] = None):
+        """Write everything pending (plus task, if given) immediately, used for terminal states."""
+        if task is not None:
+            self._dirty[task.id] = task
+        await self._drain()
+    
+    async def flush_file_now(self, file: TaskFile, *columns: str):
+        """Write everything pending plus the given file columns immediately."""
+        self.schedule_file(file, *columns)
+        await self.flush_now()
+    
+    def _arm(self):
+        if self._handle is None:
+            self._handle = asyncio.get_running_loop().call_later(self.delay, self._flush)
+    
+    def _take(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        tasks = list(self._dirty.values())
+        
+        # A full task write already covers its files
+        file_updates = [
+            (file, columns) for (task_id, _), (file, columns) in self._dirty_files.items()
+            if task_id not in self._dirty
+        ]
+        self._dirty.clear()
+        self._dirty_files.clear()
+        return tasks, file_updates
+    
+    # Write whatever is pending once no other write is running, empty when an earlier waiter took it
+    async def _drain(self):
+        async with self._write_lock:
+            await self._write(*self._take())
+    
+    def _flush(self):
+        flush = asyncio.create_task(self._drain())
+        self._flushes.add(flush)
+        flush.add_done_callback(self._flushes.discard)
+    
+    async def _write(self, tasks: List[Task], file_updates: List[Tuple[TaskFile, Set[str]]]):
+        if not tasks and not file_updates:
+            return
+        try:
+            await asyncio.to_thread(self._persist, tasks, file_updates)
+        except Exception as e:
+            task_ids = {task.id for task in tasks} | {file.task_id for file, _ in file_updates}
+            log.error("❌ Error saving tasks %s: %s", ", ".join(task_ids), e)
+    
+    # Runs in a worker thread
+    def _persist(self, tasks: List[Task], file_updates: List[Tuple[TaskFile, Set[str]]]):
+        if file_updates:
+            self.db.update_files(file_updates)
+        if tasks:
+            self.db.add_tasks(tasks)
@@ -0,0 +1,32 @@
+import asyncio
+from typing import Dict, Set
+
+# Per-subscriber buffer, a slow client loses its oldest updates instead of growing memory
+CHANNEL_SIZE = 100
+
+# Live update subscribers by task id, each subscriber (e.g. an SSE connection) owns one queue
+_channels: Dict[str, Set[asyncio.Queue]] = {}
+
+def subscribe(task_id: str) -> asyncio.Queue:
+    """Start receiving update messages for a task."""
+    channel = asyncio.Queue(maxsize=CHANNEL_SIZE)
+    _channels.setdefault(task_id, set()).add(channel)
+    return channel
+
+def unsubscribe(task_id: str, channel: asyncio.Queue):
+    subscribers = _channels.get(task_id)
+    if subscribers is not None:
+        subscribers.discard(channel)
+        if not subscribers:
+            del _channels[task_id]
+
+def is_watched(task_id: str) -> bool:
+    """Whether anyone is subscribed, lets publishers skip building messages nobody reads."""
+    return task_id in _channels
+
+def publish(task_id: str, message: Dict):
+    """Push a message to every subscriber of a task, must be called on the event loop."""
+    for channel in _channels.get(task_id, ()):
+        if channel.full():
+            channel.get_nowait()
+        channel.put_nowait(message)
@@ -1,26 +1,64 @@
 import asyncio
-from typing import Optional, List, Dict
+import gc
+import logging
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Optional, List, Dict, Deque
 from .task_model import Task, TaskFile, FileStatus
 from database.task_database import TaskDatabase
-from .task_processor import process_task
+from .task_processor import process_task, set_inference_workers
+from .pending_writer import PendingWriter
+from .log_context import task_ctx
+from . import progress_channels
+
+log = logging.getLogger(__name__)
 
 # Global instances and state
 db = TaskDatabase()
+writer = PendingWriter(db)
+
+# Tasks being processed by id, oldest first, holding their asyncio tasks so they aren't garbage collected.
+# Every queued task runs as soon as it is dispatched, the file worker queue's bound is the backpressure
+running_tasks: Dict[str, asyncio.Task] = {}
 
-# Track the ID of the currently processing task
-current_task_id: Optional[str] = None
+# In-memory FIFO index of queued task ids, oldest first.
+# Dispatch pops from here instead of scanning the database for pending tasks
+_PENDING: Deque[str] = deque()
 
 # Global trackiing of queue state
 is_running = False
 
+# Set whenever work is queued, the dispatcher sleeps on it instead of polling
+_WORK = asyncio.Event()
+
+# Live Task objects by id. The in-memory task is authoritative while it is queued or
+# processing, so status reads use it directly instead of rebuilding it from the database.
+# Finished tasks stay cached for TASK_CACHE_TTL seconds, then reads fall back to the database.
+# Both dicts are only mutated on the event loop, status endpoints read them from the threadpool
+TASK_CACHE_TTL = 5 * 60
+_TASK_CACHE: Dict[str, Task] = {}
+_TASK_CACHE_EXPIRY: Dict[str, float] = {}
+
 # Global whisper model configuration
 model = None
 model_name = None
-def set_model(whisper_model, name: str):
-    """Set the Whisper model for processing tasks."""
-    global model, model_name
+infer_executor = None
+def set_model(whisper_model, name: str, executor: Optional[Executor] = None, workers: Optional[int] = None):
+    """Set the Whisper model (and optionally the executor inference runs on, with its width) for processing tasks."""
+    global model, model_name, infer_executor
+    replaced = model is not None and model is not whisper_model
     model = whisper_model
     model_name = name
+    if executor is not None:
+        infer_executor = executor
+    if workers is not None:
+        set_inference_workers(workers)
+    
+    # Free the replaced model's memory now rather than whenever the GC gets to it
+    # (in-flight tasks keep their own reference until they finish)
+    if replaced:
+        gc.collect()
     
 # The main function to add a task to the queue
 async def add_task(file_paths: List[str], user_id: Optional[str] = None) -> str:
@@ -28,34 +66,60 @@ async def add_task(file_paths: List[str], user_id: Optional[str] = None) -> str:
     global is_running
     
     task = Task(file_paths, user_id)
-    db.add_task(task)
     
-    # Start queue processing if not already running
+    # Cached before the write so a reconciliation running meanwhile knows it is queued here
+    _TASK_CACHE[task.id] = task
+    try:
+        await asyncio.to_thread(db.add_task, task)  # SQLite write off the event loop
+    except Exception:
+        _evict_task(task.id)
+        raise
+    _PENDING.append(task.id)
+    _WORK.set()
+    
+    # Start the dispatcher if not already running (flag set here so concurrent uploads can't start two)
     if not is_running:
+        is_running = True
         asyncio.create_task(_process_queue())
         
     return task.id
 
 def get_task(task_id: str) -> Optional[Task]:
-    """Retrieve a task by its ID."""
-    return db.retrieve_task(task_id)
+    """Retrieve a task by its ID, from the live task cache when possible."""
+    task = _TASK_CACHE.get(task_id)
+    if task is not None:
+        expiry = _TASK_CACHE_EXPIRY.get(task_id)
+        if expiry is None or expiry > time.monotonic():
+            return task
+    return db.retrieve_task(task_id)  # expired ones are evicted by _expire_task on the loop
+
+def _evict_task(task_id: str):
+    _TASK_CACHE.pop(task_id, None)
+    _TASK_CACHE_EXPIRY.pop(task_id, None)
+
+# Start the expiry clock for a finished task and drop any finished tasks past theirs
+def _expire_task(task_id: str):
+    now = time.monotonic()
+    for expired_id in [i for i, expiry in _TASK_CACHE_EXPIRY.items() if expiry <= now]:
+        _evict_task(expired_id)
+    _TASK_CACHE_EXPIRY[task_id] = now + TASK_CACHE_TTL
 
 def get_file(task_id: str, file_index: int) -> Optional[TaskFile]:
     """Get specific file in a task by task id and file index"""
-    task = db.retrieve_task(task_id)
+    task = get_task(task_id)
     if task:
         return task.get_file(file_index)
     return None
 
 def get_status(task_id: str) -> Optional[Dict]:
     """Get the status of a specific task with file-level details."""
-    task = db.retrieve_task(task_id)
+    task = get_task(task_id)
     if task:
         return task.json_response_format()
     return None
 
 def get_completed_results(task_id: str) -> Optional[Dict]:
-    task = db.retrieve_task(task_id)
+    task = get_task(task_id)
     if not task:
         return None
     
@@ -71,7 +135,7 @@ def get_completed_results(task_id: str) -> Optional[Dict]:
                 "transcription": f.transcription,
                 "language": f.language,
                 "duration": f.duration,
-                "completed_at": f.completed_at.isoformat()
+                "completed_at": f.completed_at
             }
             for f in completed_files
         ]
@@ -89,13 +153,13 @@ def get_file_result(task_id: str, file_index: int) -> Optional[Dict]:
             "transcription": file.transcription,
             "language": file.language,
             "duration": file.duration,
-            "completed_at": file.completed_at.isoformat()
+            "completed_at": file.completed_at
         }
     return None
 
 def get_queue_info_for_task(task_id: str) -> Dict:
     """Get queue information specific to a task."""
-    task = db.retrieve_task(task_id)
+    task = get_task(task_id)
     if not task:
         return {"queue_length": 0, "is_processing": False, "current_task": None}
     
@@ -106,7 +170,7 @@ def get_queue_info_for_task(task_id: str) -> Dict:
         # Task is processing or completed
         return {
             "queue_length": 0,  # Not in queue anymore
-            "is_processing": current_task_id == task_id,
+            "is_processing": task_id in running_tasks,
             "current_task": get_status(task_id)
         }
     else:
@@ -122,59 +186,98 @@ def get_queue_info() -> Dict:
     """Get general queue statistics."""
     pending_count = db.count_truly_pending_tasks()  # Only count tasks that haven't started
     
+    # Runs in the threadpool while the loop updates running_tasks, so read it once
+    active = list(running_tasks)
     return {
         "queue_length": pending_count,
-        "is_processing": current_task_id is not None,
-        "current_task": get_status(current_task_id) if current_task_id else None
+        "is_processing": bool(active),
+        "current_task": get_status(active[0]) if active else None,
+        "active_task_ids": active
     }
 
-# Ensure only one task is in processing at a time, private function
+def _load_tasks(task_ids: List[str]) -> Dict[str, Optional[Task]]:
+    return {task_id: db.retrieve_task(task_id) for task_id in task_ids}
+
+# Prefer the live cached objects so status reads see the same Task that is being processed.
+# Only the database reads go to a worker thread, the cache is updated back on the loop
+async def _retrieve_tasks(task_ids: List[str]) -> List[Task]:
+    missing = [task_id for task_id in task_ids if task_id not in _TASK_CACHE]
+    loaded = await asyncio.to_thread(_load_tasks, missing) if missing else {}
+    
+    tasks = []
+    for task_id in task_ids:
+        task = _TASK_CACHE.get(task_id) or loaded.get(task_id)
+        if task is None:
+            continue
+        _TASK_CACHE[task_id] = task
+        _TASK_CACHE_EXPIRY.pop(task_id, None)  # processing again, no longer expiring
+        if task.get_pending_files():  # never rerun finished files, their uploads are gone
+            tasks.append(task)
+    return tasks
+
+# Process a single task, failing any unfinished files if processing errors out
+async def _run_task(task: Task):
+    # Each _run_task runs in its own asyncio task, so this only tags this task's logs
+    task_ctx.set(task.id)
+    log.info("🔄 Processing task with %d files", len(task.files))
+    
+    # Process the task (calling task processor function)
+    try:
+        log.info("📋 Starting transcription with model %s", model_name)
+        await process_task(task, model, model_name, writer, infer_executor)
+        
+        completed_count = len(task.get_completed_files())
+        failed_count = len(task.get_failed_files())
+        log.info("✅ Task completed: %d successful, %d failed", completed_count, failed_count)
+    
+    except Exception as e:
+        log.error("❌ Error processing task: %s", e)
+
+        for file in task.files:
+            if file.status in [FileStatus.PENDING, FileStatus.PROCESSING]:
+                file.fail(f"Task processing error: {str(e)}")
+        await writer.flush_now(task)
+    
+    finally:
+        _expire_task(task.id)
+        # Tell live subscribers the task is finished so their streams can close
+        progress_channels.publish(task.id, {"event": "done", "summary": task.summary()})
+        
+        # Last one out wakes the dispatcher so it reconciles with the database once
+        running_tasks.pop(task.id, None)
+        if not running_tasks and not _PENDING:
+            log.info("✅ Queue processing completed")
+            _WORK.set()
+
+# Start every pending task now, their files interleave on the shared worker queue
+async def _drain_queue():
+    # Index drained: reconcile once with the database in case anything pending was missed.
+    # Cached tasks are skipped, they are queued, running, finished or still being added
+    if not _PENDING:
+        for task in await asyncio.to_thread(db.retrieve_pending):
+            if task.id not in _TASK_CACHE:
+                _PENDING.append(task.id)
+    
+    task_ids = list(_PENDING)
+    _PENDING.clear()
+    for task in await _retrieve_tasks(task_ids):
+        if task.id not in running_tasks:
+            running_tasks[task.id] = asyncio.create_task(_run_task(task))
+
+# Long-lived dispatcher: wait for work, then start the queued tasks, private function
 async def _process_queue():
-    """Process tasks in the queue one at a time."""
-    global is_running, current_task_id
+    """Dispatch queued tasks as they arrive."""
+    global is_running
     
     is_running = True
     try:
         while True:
-            pending_tasks = db.retrieve_pending()
-            # If no pending tasks, exit loop
-            if not pending_tasks:
-                break
+            await _WORK.wait()
+            _WORK.clear()
             
-            # Get the next task in the queue
-            task = pending_tasks[0]
-            
-            # Mark as current task
-            current_task_id = task.id
-            
-            # Change state to processing
-            print(f"🔄 Processing task {task.id} with {len(task.files)}")
-            
-            # Process the task (calling task processor function)
             try:
-                print(f"📋 Starting transcription for task {task.id} with model {model_name}")
-                await process_task(task, model, model_name, db)
-                
-                completed_count = len(task.get_completed_files())
-                failed_count = len(task.get_failed_files())
-                print(f"✅ Task {task.id} completed: {completed_count} successful, {failed_count} failed")
-            
+                await _drain_queue()
             except Exception as e:
-                print(f"❌ Error processing task {task.id}: {e}")
-
-                for file in task.files:
-                    if file.status in [FileStatus.PENDING, FileStatus.PROCESSING]:
-                        file.fail(f"Task processing error: {str(e)}")
-                db.add_task(task)
-        
-            # Clear current task before moving to next
-            current_task_id = None
-            await asyncio.sleep(0.5)  # Brief pause between tasks
-            
-    except Exception as e:
-        print(f"Error detected in queue processing: {e}")
-        current_task_id = None
+                log.error("Error detected in queue processing: %s", e)
     finally: 
         is_running = False
-        current_task_id = None
-        print("✅ Queue processing completed")
\ No newline at end of file
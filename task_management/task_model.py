@@ -1,26 +1,40 @@
 from enum import Enum
 from datetime import datetime
 from typing import List, Optional, Dict
-import uuid, os
+import uuid, os, time
 
-# Task status enumeration, 5 states available
-class TaskStatus(Enum):
-    PENDING = "pending"
-    PROCESSING = "processing"
-    IN_PROGRESS = "in_progress"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    
+# File status enumeration, 4 states available
 class FileStatus(Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
 
+# Precomputed status <-> string lookups, plain dict hits instead of Enum .value / FileStatus(...) on hot paths
+FILE_STATUS_STR: Dict[FileStatus, str] = {s: s.value for s in FileStatus}
+FILE_STATUS_FROM_STR: Dict[str, FileStatus] = {s.value: s for s in FileStatus}
+
+# Timestamps are kept as integer epoch microseconds (the database format) and only
+# turned into datetime objects when read through the created_at/started_at/completed_at properties
+def now_us() -> int:
+    return time.time_ns() // 1_000
+
+def from_epoch_us(us: Optional[int]) -> Optional[datetime]:
+    return datetime.fromtimestamp(us // 1_000_000).replace(microsecond=us % 1_000_000) if us is not None else None
+
 # Class data structure for individual files within a task
 class TaskFile:
     """Class representing individual files within a transcription task (class Task)."""
     
+    # Fixed attribute layout, no per-instance __dict__ (tasks can hold many files)
+    __slots__ = (
+        "file_path", "file_index", "task_id", "file_name",
+        "status", "progress",
+        "transcription", "language", "duration", "error_message",
+        "created_at_us", "started_at_us", "completed_at_us",
+        "_dirty",
+    )
+    
     def __init__(self, file_path: str, file_index: int, task_id: str):
         self.file_path = file_path
         self.file_index = file_index
@@ -37,18 +51,25 @@ class TaskFile:
         self.duration = None
         self.error_message = None
         
-        # Timestamps
-        self.created_at = datetime.now()
-        self.started_at = None
-        self.completed_at = None
+        # Timestamps (epoch microseconds)
+        self.created_at_us = now_us()
+        self.started_at_us = None
+        self.completed_at_us = None
+        
+        # Set on every state change so the owning Task knows its cached response is stale.
+        # Mutators set it after writing their fields, so a reader on another thread that
+        # clears it mid-update still sees the flag raised again once the update lands
+        self._dirty = True
     
     def start_processing(self):
         self.status = FileStatus.PROCESSING
         self.progress = 0
-        self.started_at = datetime.now()
+        self.started_at_us = now_us()
+        self._dirty = True
         
     def update_progress(self, progress: int):
         self.progress = progress
+        self._dirty = True
     
     def complete(self, transcription: str, language: str, duration: float):
         self.status = FileStatus.COMPLETED
@@ -56,29 +77,43 @@ class TaskFile:
         self.transcription = transcription
         self.language = language
         self.duration = duration
-        self.completed_at = datetime.now()
+        self.completed_at_us = now_us()
+        self._dirty = True
     
     def fail(self, error_message: str):
         self.status = FileStatus.FAILED
         self.error_message = error_message
-        self.completed_at = datetime.now()
+        self.completed_at_us = now_us()
+        self._dirty = True
+        
+    @property
+    def created_at(self) -> datetime:
+        return from_epoch_us(self.created_at_us)
+    
+    @property
+    def started_at(self) -> Optional[datetime]:
+        return from_epoch_us(self.started_at_us)
+    
+    @property
+    def completed_at(self) -> Optional[datetime]:
+        return from_epoch_us(self.completed_at_us)
         
     def file_has_result(self) -> bool:
-        return self.status == FileStatus.COMPLETED and self.transcription is not None
+        return self.status is FileStatus.COMPLETED and self.transcription is not None
     
     def json_response_format(self) -> Dict:
         """Convert file info to dictionary for API responses"""
         return {
             "file_index": self.file_index,
             "file_name": self.file_name,
-            "status": self.status.value,
+            "status": FILE_STATUS_STR[self.status],
             "progress": self.progress,
             "error": self.error_message,
             
             "timestamps": {
-                "created_at": self.created_at.isoformat(),
-                "started_at": self.started_at.isoformat() if self.started_at else None,
-                "completed_at": self.completed_at.isoformat() if self.completed_at else None
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "completed_at": self.completed_at
             }
         }
 
@@ -86,13 +121,22 @@ class TaskFile:
 class Task:
     """Task model class representing a whole transcription task."""
     
+    __slots__ = ("id", "user_id", "created_at_us", "files", "_response_cache")
+    
     # Initialize a new task with file paths and optional user ID (for now)
     def __init__(self, file_paths: List[str], user_id: Optional[str] = None):
         self.id = str(uuid.uuid4()) 
         self.user_id = user_id # Placeholder for future user association
-        self.created_at = datetime.now()
+        self.created_at_us = now_us()
         
         self.files = [TaskFile(path, i, self.id) for i, path in enumerate(file_paths)]
+        
+        # Memoized json_response_format(), rebuilt only after a file changes
+        self._response_cache = None
+    
+    @property
+    def created_at(self) -> datetime:
+        return from_epoch_us(self.created_at_us)
     
     def get_file(self, file_index: int) -> Optional[TaskFile]:
         if 0 <= file_index < len(self.files):
@@ -103,27 +147,35 @@ class Task:
         return [f for f in self.files if f.file_has_result()]
 
     def get_failed_files(self) -> List[TaskFile]:
-        return [f for f in self.files if f.status == FileStatus.FAILED]
+        return [f for f in self.files if f.status is FileStatus.FAILED]
     
     def get_in_progress_files(self) -> List[TaskFile]:
-        return [f for f in self.files if f.status == FileStatus.PROCESSING]
+        return [f for f in self.files if f.status is FileStatus.PROCESSING]
     
     def get_pending_files(self) -> List[TaskFile]:
-        return [f for f in self.files if f.status == FileStatus.PENDING]
+        return [f for f in self.files if f.status is FileStatus.PENDING]
 
-    # Convert a task to dictionary format for API responses
-    def json_response_format(self) -> Dict:
-        """Convert task to dictionary for API responses"""
+    def summary(self) -> Dict:
+        """Summary counts and overall status/progress of the task's files"""
         
+        # Tally statuses and progress in one pass
+        counts = {status: 0 for status in FileStatus}
+        progress_sum = 0
+        for f in self.files:
+            counts[f.status] += 1
+            progress_sum += f.progress
+        return self._summary_from_counts(counts, progress_sum)
+    
+    def _summary_from_counts(self, counts: Dict[FileStatus, int], progress_sum: int) -> Dict:
         # Calculate summary stats
         total_files = len(self.files)
-        completed_files = len(self.get_completed_files())
-        failed_files = len(self.get_failed_files())
-        processing_files = len(self.get_in_progress_files())
-        pending_files = len(self.get_pending_files())
+        completed_files = counts[FileStatus.COMPLETED]
+        failed_files = counts[FileStatus.FAILED]
+        processing_files = counts[FileStatus.PROCESSING]
+        pending_files = counts[FileStatus.PENDING]
         
         # Overall progress (average of all file progress)
-        overall_progress = sum(f.progress for f in self.files) // total_files if total_files > 0 else 0
+        overall_progress = progress_sum // total_files if total_files > 0 else 0
             
         # Determine overall status
         if completed_files + failed_files == total_files:
@@ -134,31 +186,55 @@ class Task:
             overall_status = "pending"
             
         return {
-            "task_id": self.id,
-            "created_at": self.created_at.isoformat(),
-            
-            # Summary for quick overview
-            "summary": {
-                "overall_status": overall_status,
-                "overall_progress": overall_progress,
-                "total_files": total_files,
-                "completed": completed_files,
-                "failed": failed_files,
-                "processing": processing_files,
-                "pending": pending_files
-            },
+            "overall_status": overall_status,
+            "overall_progress": overall_progress,
+            "total_files": total_files,
+            "completed": completed_files,
+            "failed": failed_files,
+            "processing": processing_files,
+            "pending": pending_files
+        }
+
+    # Convert a task to dictionary format for API responses.
+    # Timestamps stay datetime objects, the status endpoints return this through ORJSONResponse
+    # directly (bypassing jsonable_encoder) so orjson serializes them to ISO 8601 natively
+    def json_response_format(self) -> Dict:
+        """Convert task to dictionary for API responses"""
+        
+        if self._response_cache is not None and not any(f._dirty for f in self.files):
+            return self._response_cache
+        
+        # Single pass over the files: tally the summary and build both file lists together
+        counts = {status: 0 for status in FileStatus}
+        progress_sum = 0
+        files_json = []
+        completed_results = []
+        for f in self.files:
+            f._dirty = False
+            counts[f.status] += 1
+            progress_sum += f.progress
             
-            "files": [file.json_response_format() for file in self.files],
-            "completed_results": [
-                {
+            file_json = f.json_response_format()
+            files_json.append(file_json)
+            if f.file_has_result():
+                completed_results.append({
                     "file_index": f.file_index,
                     "file_name": f.file_name,
                     "transcription": f.transcription,
                     "language": f.language,
                     "duration": f.duration,
-                    "completed_at": f.completed_at.isoformat()
-                }
-                for f in self.get_completed_files()
-            ]
+                    "completed_at": file_json["timestamps"]["completed_at"]  # already converted above
+                })
+        
+        self._response_cache = {
+            "task_id": self.id,
+            "created_at": self.created_at,
+            
+            # Summary for quick overview
+            "summary": self._summary_from_counts(counts, progress_sum),
+            
+            "files": files_json,
+            "completed_results": completed_results
         }
+        return self._response_cache
     
\ No newline at end of file
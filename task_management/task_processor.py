@@ -1,82 +1,208 @@
-import os, asyncio
-from typing import List, Dict
-from .task_model import Task, FileStatus
-from database.task_database import TaskDatabase
+import asyncio, os, logging
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Optional, Callable, Set, List
+import numpy as np
+from faster_whisper import decode_audio
+from .task_model import Task, TaskFile, FILE_STATUS_STR
+from .pending_writer import PendingWriter
+from .log_context import task_ctx, file_ctx
+from . import progress_channels
 
-async def process_task(task: Task, model, model_name: str, db: TaskDatabase):
-    """Process a transcription task and return results."""
-    total_files = len(task.files)
-    
-    for file in task.files:
+log = logging.getLogger(__name__)
+
+# Number of 30s audio windows the batched pipeline decodes per forward pass
+TRANSCRIBE_BATCH_SIZE = 16
+
+# Files allowed to be in inference at once, as many as the inference executor has threads
+# (see set_inference_workers), so a file only holds a slot and its decoded audio while it can run.
+# Extra files wait here instead of piling up in the executor queue
+_infer_slots = asyncio.Semaphore(1)
+
+# Shared file worker pool: tasks enqueue their files and n_file_workers coroutines process them,
+# from whichever task, in arrival order. Twice the inference slots so the extra workers decode the
+# next files while the others are in inference. The bounded queue makes producers wait when it is full
+n_file_workers = 2
+WORK_QUEUE_SIZE = 128
+_work_q: asyncio.Queue = asyncio.Queue(maxsize=WORK_QUEUE_SIZE)
+_workers: List[asyncio.Task] = []
+
+# Highest progress reported while decoding, 100 is only set by file.complete()
+MAX_DECODE_PROGRESS = 99
+
+# task_files columns touched by each file state change, written on their own instead of the whole task.
+# Intermediate progress is not persisted, it is pushed to live subscribers through progress_channels
+START_COLUMNS = ("status", "progress", "started_at")
+COMPLETE_COLUMNS = ("status", "progress", "transcription", "language", "duration", "completed_at")
+FAIL_COLUMNS = ("status", "error_message", "completed_at")
+
+# Output of one transcription, only the fields a TaskFile keeps
+@dataclass(frozen=True, slots=True)
+class TranscribeResult:
+    text: str
+    language: Optional[str]
+    duration: Optional[float]
+
+# Push a file's state change to the task's live subscribers, if there are any
+def _publish_file(file: TaskFile):
+    if progress_channels.is_watched(file.task_id):
+        progress_channels.publish(file.task_id, {
+            "event": "file",
+            "file_index": file.file_index,
+            "status": FILE_STATUS_STR[file.status],
+            "progress": file.progress,
+            "error": file.error_message
+        })
+
+# Upload deletions in flight, referenced so they aren't garbage collected before finishing
+_CLEANUPS: Set[asyncio.Task] = set()
+
+async def _safe_unlink(path: str):
+    try:
+        await asyncio.to_thread(os.unlink, path)
+    except FileNotFoundError:
+        pass
+
+# Delete a processed upload in the background so the next file can start right away
+def _schedule_cleanup(path: str) -> asyncio.Task:
+    cleanup = asyncio.create_task(_safe_unlink(path))
+    _CLEANUPS.add(cleanup)
+    cleanup.add_done_callback(_CLEANUPS.discard)
+    return cleanup
+
+def set_inference_workers(workers: int):
+    """Match the inference slots and file worker pool to the inference executor, before any task runs."""
+    global _infer_slots, n_file_workers
+    _infer_slots = asyncio.Semaphore(workers)
+    n_file_workers = 2 * workers
+
+# Start the file workers on first use, they need the running event loop
+def _ensure_workers():
+    if not _workers:
+        _workers.extend(asyncio.create_task(_worker()) for _ in range(n_file_workers))
+
+async def _worker():
+    while True:
+        task, file, model, writer, executor, done = await _work_q.get()
+        
+        # Workers are long-lived, so the log context is set per file and reset afterwards
+        task_token, file_token = task_ctx.set(task.id), file_ctx.set(file.file_name)
         try:
-            print(f'🔄 Starting file {file.file_index + 1}/{total_files}: {file.file_name}')
-            
-            file.start_processing()
-            db.add_task(task)  # Save immediately so frontend sees processing status
-            
-            await _transcribe_file_with_progress(file, model, task, db)
-            
-            print(f"✅ File {file.file_name} completed")
-            
+            cleanup = await _process_one(task, file, model, writer, executor)
+            if not done.done():
+                done.set_result(cleanup)
         except Exception as e:
-            print(f"❌ Error transcribing {file.file_name}: {e}")
-            file.fail(str(e))
-            db.add_task(task)  # Save failure immediately
-            
-            
+            if not done.done():
+                done.set_exception(e)
         finally:
-            if os.path.exists(file.file_path):
-                os.remove(file.file_path)
-                
-    db.add_task(task)  # Final save after all files processed
-    print(f"🗂️ All files for task {task.id} processed")
+            task_ctx.reset(task_token)
+            file_ctx.reset(file_token)
+            _work_q.task_done()
 
-async def _transcribe_file_with_progress(file, model, task: Task, db: TaskDatabase):
-    """Transcribe file with independent result storage"""
-    
+# Transcribe one file of a task, returns its scheduled upload deletion
+async def _process_one(task: Task, file: TaskFile, model, writer: PendingWriter, executor: Optional[Executor] = None) -> asyncio.Task:
+    path = file.file_path
     try:
-        from mutagen import File
-        # Get file duration for progress estimation
-        audio_file = File(file.file_path)
-        duration = 0
-        if audio_file and audio_file.info:
-            duration = audio_file.info.length
-        
-        # Estimate transcription time (6x faster than file duration)
-        estimated_time = duration / 6 if duration > 0 else 30  # fallback to 30 seconds
-        progress_interval = estimated_time / 4  # 94intervals for 10-90% progress
+        log.info("🔄 Starting file %d/%d", file.file_index + 1, len(task.files))
         
-        # Start transcription task
-        transcription_task = asyncio.create_task(_transcribe_file(file.file_path, model))
+        file.start_processing()
+        writer.schedule_file(file, *START_COLUMNS)  # Save soon so frontend sees processing status
+        _publish_file(file)
         
-        # Update progress while transcription runs
-        progress = 10
-        while not transcription_task.done() and progress < 95:
-            file.update_progress(progress)
-            db.add_task(task)  # Save progress
-            await asyncio.sleep(progress_interval)
-            progress += 20
+        await _transcribe_file_with_progress(file, model, task, writer, executor)
         
-        # Wait for transcription to complete
-        result = await transcription_task
-        
-        # Complete file and save result when done
-        file.complete(
-            transcription=result.get("text", ""),
-            language=result.get("language"),
-            duration=result.get("duration")
-        )
-        db.add_task(task)
-        
-        print(f"✅ File {file.file_name} result available")
+        log.info("✅ File completed")
         
     except Exception as e:
+        log.error("❌ Error transcribing: %s", e)
         file.fail(str(e))
-        db.add_task(task)
-        raise
+        _publish_file(file)
+        await writer.flush_file_now(file, *FAIL_COLUMNS)  # Save failure immediately
+        
+    finally:
+        cleanup = _schedule_cleanup(path)
+    return cleanup
 
+async def process_task(task: Task, model, model_name: str, writer: PendingWriter, executor: Optional[Executor] = None):
+    """Process a transcription task and return results."""
+    _ensure_workers()
+    loop = asyncio.get_running_loop()
+    
+    # Hand the files to the worker pool (waiting while the queue is full), then wait for this task's files only
+    pending = []
+    for file in task.files:
+        done = loop.create_future()
+        await _work_q.put((task, file, model, writer, executor, done))
+        pending.append(done)
+    
+    cleanups = await asyncio.gather(*pending, return_exceptions=True)
+    await asyncio.gather(*(c for c in cleanups if isinstance(c, asyncio.Task)), return_exceptions=True)  # task's uploads are gone once it finishes
+    
+    # Final save after all files processed, flushed immediately so the queue
+    # never re-reads this task as pending before the writer catches up
+    await writer.flush_now(task)
+    log.info("🗂️ All files processed")
 
-async def _transcribe_file(file_path: str, model) -> Dict:
-    """Transcribe a single file using the provided model"""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, model.transcribe, file_path)
\ No newline at end of file
+async def _transcribe_file_with_progress(file, model, task: Task, writer: PendingWriter, executor: Optional[Executor] = None):
+    """Transcribe file with independent result storage"""
+    # Failures propagate, the caller (_process_one) marks and saves the failed file
+    loop = asyncio.get_running_loop()
+    
+    # Progress reported from the inference thread is handed back to the event loop through this queue
+    progress_queue = asyncio.Queue()
+    def report_progress(progress: int):
+        loop.call_soon_threadsafe(progress_queue.put_nowait, progress)
+    
+    # Start transcription task, None marks the end of the progress stream
+    transcription_task = asyncio.create_task(_transcribe_file(file.file_path, model, executor, report_progress))
+    transcription_task.add_done_callback(lambda _: progress_queue.put_nowait(None))
+    
+    # Update progress as segments are decoded and push it to live subscribers.
+    # Methods bound once, this loop runs for every reported percentage
+    update_progress, next_progress = file.update_progress, progress_queue.get
+    task_id, file_index = file.task_id, file.file_index
+    while (progress := await next_progress()) is not None:
+        update_progress(progress)
+        if progress_channels.is_watched(task_id):
+            progress_channels.publish(task_id, {"event": "progress", "file_index": file_index, "progress": progress})
+    
+    # Wait for transcription to complete
+    result = await transcription_task
+    
+    # Complete file and save result when done
+    file.complete(transcription=result.text, language=result.language, duration=result.duration)
+    _publish_file(file)
+    await writer.flush_file_now(file, *COMPLETE_COLUMNS)  # Terminal state, save immediately
+    
+    log.info("✅ Result available")
+
+
+async def _transcribe_file(file_path: str, model, executor: Optional[Executor] = None,
+                           on_progress: Optional[Callable[[int], None]] = None) -> TranscribeResult:
+    """Transcribe a single file using the provided model on the inference executor"""
+    # Decode to 16kHz mono float32 on the default pool first, so decoding this file
+    # overlaps another file's inference instead of holding an inference slot
+    audio = await asyncio.to_thread(decode_audio, file_path)
+    
+    async with _infer_slots:
+        return await asyncio.get_running_loop().run_in_executor(executor, _run_transcription, audio, model, on_progress)
+
+def _run_transcription(audio: np.ndarray, model, on_progress: Optional[Callable[[int], None]] = None) -> TranscribeResult:
+    """Blocking batched transcription of decoded audio, runs in the executor."""
+    segments, info = model.transcribe(audio, batch_size=TRANSCRIBE_BATCH_SIZE)
+    
+    # Segments are generated lazily, decoding happens while they are consumed.
+    # Progress is the share of audio decoded so far, reported only when the percentage changes
+    texts = []
+    last_progress = -1
+    # Percent per audio second, computed once instead of dividing per segment
+    scale = 100 / info.duration if on_progress and info.duration else 0
+    for segment in segments:
+        texts.append(segment.text)
+        if scale:
+            progress = min(MAX_DECODE_PROGRESS, int(segment.end * scale))
+            if progress != last_progress:
+                last_progress = progress
+                on_progress(progress)
+    
+    return TranscribeResult("".join(texts), info.language, info.duration)
\ No newline at end of file